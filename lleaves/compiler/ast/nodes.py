@@ -1,22 +1,99 @@
-from dataclasses import dataclass, field
+from dataclasses import dataclass
 from typing import List
 
+import numpy as np
+
 from lleaves.compiler.utils import DecisionType
 
 
-class Node:
-    @property
-    def is_leaf(self):
-        return isinstance(self, LeafNode)
+@dataclass
+class NodeArray:
+    """
+    Structure-of-arrays representation of all decision nodes of a tree.
+
+    Entry ``i`` of each array belongs to the node with index ``i``, the root node has index 0.
+    Children are referenced like in the model.txt: Non-negative values are node indices,
+    negative values refer to leaves with ``leaf_idx = ~child``.
+    """
+
+    split_feature: np.ndarray
+    # for categorical nodes the threshold is the index into cat_boundaries
+    threshold: np.ndarray
+    decision_type: np.ndarray
+    left: np.ndarray
+    right: np.ndarray
+    # the bitsets of all categorical nodes, concatenated. Node i's bitset is
+    # cat_threshold[cat_boundaries[t] : cat_boundaries[t + 1]] with t = threshold[i]
+    cat_boundaries: np.ndarray
+    cat_threshold: np.ndarray
+
+    def __len__(self):
+        return len(self.split_feature)
+
+    def get_decision_type(self, idx):
+        return DecisionType(int(self.decision_type[idx]))
+
+    def get_cat_threshold(self, idx):
+        """The threshold in bit-representation of categorical node idx"""
+        thresh = int(self.threshold[idx])
+        start = self.cat_boundaries[thresh]
+        end = self.cat_boundaries[thresh + 1]
+        return self.cat_threshold[start:end].tolist()
+
+
+def is_leaf(child):
+    return child < 0
 
 
 @dataclass
 class Tree:
     idx: int
-    root_node: Node
+    nodes: NodeArray
+    leaf_value: np.ndarray
     features: list
     class_id: int
 
+    @property
+    def root(self):
+        # special case for when tree is just a single leaf
+        return 0 if len(self.nodes) else ~0
+
+    def children(self, node):
+        return int(self.nodes.left[node]), int(self.nodes.right[node])
+
+    def height(self):
+        """Number of levels of the tree, counting the leaves"""
+        height = 0
+        level = [self.root]
+        while level:
+            height += 1
+            level = [c for n in level if not is_leaf(n) for c in self.children(n)]
+        return height
+
+    def veb_order(self):
+        """
+        All nodes and leaves of the tree in van Emde Boas order.
+
+        The tree is split at half its height, the top half is laid out first,
+        followed by each of the bottom subtrees. Both halves are laid out recursively.
+        This keeps nodes that are visited in sequence close to each other, independent of the cache line size.
+        """
+        return self._veb_order(self.root, self.height())
+
+    def _veb_order(self, root, height):
+        if height == 1 or is_leaf(root):
+            return [root]
+        top_height = (height + 1) // 2
+        order = self._veb_order(root, top_height)
+        bottom_roots = [root]
+        for _ in range(top_height):
+            bottom_roots = [
+                c for n in bottom_roots if not is_leaf(n) for c in self.children(n)
+            ]
+        for bottom_root in bottom_roots:
+            order += self._veb_order(bottom_root, height - top_height)
+        return order
+
     def __str__(self):
         return f"tree_{self.idx}"
 
@@ -35,46 +112,3 @@ class Forest:
     @property
     def n_args(self):
         return len(self.features)
-
-
-@dataclass
-class DecisionNode(Node):
-    # the threshold in bit-representation if this node is categorical
-    cat_threshold: List[int] = field(default=None, init=False)
-
-    # child nodes
-    left: Node = field(default=None, init=False)
-    right: Node = field(default=None, init=False)
-
-    idx: int
-    split_feature: int
-    threshold: int
-    decision_type: DecisionType
-    left_idx: int
-    right_idx: int
-
-    def add_children(self, left, right):
-        self.left = left
-        self.right = right
-
-    def finalize_categorical(self, cat_threshold):
-        self.cat_threshold = cat_threshold
-        self.threshold = int(self.threshold)
-
-    def validate(self):
-        if self.decision_type.is_categorical:
-            assert self.cat_threshold is not None
-        else:
-            assert self.threshold
-
-    def __str__(self):
-        return f"node_{self.idx}"
-
-
-@dataclass
-class LeafNode(Node):
-    idx: int
-    value: float
-
-    def __str__(self):
-        return f"leaf_{self.idx}"
@@ -1,15 +1,20 @@
 import itertools
 
-from lleaves.compiler.ast.nodes import DecisionNode, Forest, LeafNode, Tree
+import numpy as np
+
+from lleaves.compiler.ast.nodes import Forest, NodeArray, Tree
 from lleaves.compiler.ast.scanner import scan_model_file
 from lleaves.compiler.utils import DecisionType
 
 """
 The parser takes the results from the scanner and transforms them into an
 Abstract-Syntax Tree (AST).
-It builds up the Graph for the DecisionTree-Forest, consisting of decision-nodes and leaf-nodes.
+It builds up the DecisionTree-Forest. The decision-nodes of each tree are stored column-wise in a NodeArray,
+the leaf-nodes as an array of leaf values.
 """
 
+_EMPTY_INT = np.empty(0, dtype=np.int32)
+
 
 class Feature:
     """
@@ -21,75 +26,44 @@ class Feature:
 
 
 def _parse_tree_to_ast(tree_struct, features, class_id):
-    n_nodes = len(tree_struct["decision_type"])
-    leaves = [
-        LeafNode(idx, value) for idx, value in enumerate(tree_struct["leaf_value"])
-    ]
-
-    # Create the nodes using all non-specific data
-    # categorical nodes are finalized later
-    nodes = [
-        DecisionNode(
-            idx,
-            split_feature,
-            threshold,
-            DecisionType(decision_type_id),
-            left_idx,
-            right_idx,
-        )
-        for idx, (
-            split_feature,
-            threshold,
-            decision_type_id,
-            left_idx,
-            right_idx,
-        ) in enumerate(
-            zip(
-                tree_struct["split_feature"],
-                tree_struct["threshold"],
-                tree_struct["decision_type"],
-                tree_struct["left_child"],
-                tree_struct["right_child"],
-            )
-        )
-    ]
-    assert len(nodes) == n_nodes
-
-    categorical_nodes = [
-        idx
-        for idx, decision_type_id in enumerate(tree_struct["decision_type"])
-        if DecisionType(decision_type_id).is_categorical
-    ]
-
-    for idx in categorical_nodes:
-        node = nodes[idx]
-        thresh = int(node.threshold)
-        # pass just the relevant vector entries
-        start = tree_struct["cat_boundaries"][thresh]
-        end = tree_struct["cat_boundaries"][thresh + 1]
-        node.finalize_categorical(
-            cat_threshold=tree_struct["cat_threshold"][start:end],
-        )
-
-    for node in nodes:
-        # in the model_file.txt, the outgoing left + right nodes are specified
-        # via their index in the list. negative numbers are leaves, positive numbers
-        # are other nodes
-        children = [
-            leaves[abs(idx) - 1] if idx < 0 else nodes[idx]
-            for idx in (node.left_idx, node.right_idx)
-        ]
-        node.add_children(*children)
-
-    for node in nodes:
-        node.validate()
-
-    if nodes:
-        return Tree(tree_struct["Tree"], nodes[0], features, class_id)
-    else:
+    n_leaves = len(tree_struct["leaf_value"])
+    # decision types are validated for all trees at once in parse_to_ast
+    decision_type = tree_struct["decision_type"].astype(np.int8)
+
+    # the scanned columns are used as is, without creating an object per node
+    nodes = NodeArray(
+        split_feature=tree_struct["split_feature"],
+        threshold=tree_struct["threshold"],
+        decision_type=decision_type,
+        left=tree_struct["left_child"],
+        right=tree_struct["right_child"],
+        cat_boundaries=tree_struct.get("cat_boundaries", _EMPTY_INT),
+        cat_threshold=tree_struct.get("cat_threshold", _EMPTY_INT),
+    )
+    n_nodes = len(nodes)
+    assert all(
+        len(arr) == n_nodes
+        for arr in (nodes.threshold, nodes.decision_type, nodes.left, nodes.right)
+    ), "Ill formed model file"
+
+    is_categorical = (decision_type & DecisionType.CAT_MASK).astype(bool)
+    if is_categorical.any():
+        cat_idx = nodes.threshold[is_categorical].astype(np.int64)
+        assert (cat_idx + 1 < len(nodes.cat_boundaries)).all()
+    assert nodes.threshold[~is_categorical].all()
+
+    # children are checked for all nodes at once, negative values reference leaves
+    children = np.concatenate((nodes.left, nodes.right))
+    is_leaf_child = children < 0
+    assert (children[~is_leaf_child] < n_nodes).all(), "Ill formed model file"
+    assert (~children[is_leaf_child] < n_leaves).all(), "Ill formed model file"
+
+    if not n_nodes:
         # special case for when tree is just single leaf
-        assert len(leaves) == 1
-        return Tree(tree_struct["Tree"], leaves[0], features, class_id)
+        assert n_leaves == 1
+    return Tree(
+        tree_struct["Tree"], nodes, tree_struct["leaf_value"], features, class_id
+    )
 
 
 def parse_to_ast(model_path):
@@ -108,6 +82,15 @@ def parse_to_ast(model_path):
     ]
     assert n_args == len(features), "Ill formed model file"
 
+    # DecisionType raises for unknown decision types.
+    # Validating the whole forest in one go is much cheaper than doing it tree by tree.
+    if scanned_model["trees"]:
+        all_decision_types = np.concatenate(
+            [scanned_tree["decision_type"] for scanned_tree in scanned_model["trees"]]
+        )
+        for decision_type_id in np.unique(all_decision_types).tolist():
+            DecisionType(decision_type_id)
+
     trees = [
         _parse_tree_to_ast(scanned_tree, features, class_id)
         for scanned_tree, class_id in zip(
@@ -4,20 +4,17 @@ usable representation.
 It doesn't implement any transformations (expect for type casting).
 """
 
+import json
+import warnings
+
+import numpy as np
+
+PANDAS_CATEGORICAL_KEY = "pandas_categorical:"
+
 
 def scan_model_file(file_path, general_info_only=False):
     res = {"trees": []}
 
-    def read_blocks(file_path):
-        with open(file_path) as f:
-            while True:
-                lines = _get_next_block_of_lines(f)
-                if lines:
-                    yield lines
-                else:
-                    break
-
-    blocks = read_blocks(file_path)
     # List of blocks we expect:
     # 1* General Information
     # N* Tree, one block for each tree
@@ -27,39 +24,72 @@ def scan_model_file(file_path, general_info_only=False):
     # 1* Parameters
     # 1* 'end of parameters'
     # 1* 'pandas_categorical:XXXXX'
-
-    general_info_block = next(blocks)
-    assert general_info_block[0] == "tree" and general_info_block[1].startswith(
-        "version="
-    ), f"{file_path} is not a LightGBM model file"
-    res["general_info"] = _scan_block(general_info_block, INPUT_SCAN_KEYS)
-    if general_info_only:
-        return res
-
-    for block in blocks:
-        if block[0].startswith("Tree="):
-            res["trees"].append(_scan_tree(block))
-        else:
-            assert block[0] == "end of trees"
-            break
+    with open(file_path, buffering=1 << 20) as f:
+        blocks = _read_blocks(f)
+
+        general_info_block = next(blocks)
+        assert general_info_block[0] == "tree" and general_info_block[1].startswith(
+            "version="
+        ), f"{file_path} is not a LightGBM model file"
+        res["general_info"] = _scan_block(general_info_block, INPUT_SCAN_KEYS)
+        if general_info_only:
+            return res
+
+        with warnings.catch_warnings():
+            # np.fromstring stops at the first malformed token and only emits a DeprecationWarning.
+            # Setting up the filter once for all trees is much cheaper than once per array.
+            warnings.simplefilter("error", DeprecationWarning)
+            for block in blocks:
+                if block[0].startswith("Tree="):
+                    res["trees"].append(_scan_tree(block))
+                else:
+                    assert block[0] == "end of trees"
+                    break
+    _narrow_int_arrays(res["trees"])
     return res
 
 
+def find_pandas_categorical(buffer):
+    """
+    Searches a buffer of the model.txt (eg. a mmap) from the back for the 'pandas_categorical:XXXXX' line.
+
+    :return: The scanned pandas_categorical, or None if there is no such line.
+    """
+    start = buffer.rfind(PANDAS_CATEGORICAL_KEY.encode())
+    if start == -1:
+        return None
+    end = buffer.find(b"\n", start)
+    line = buffer[start : end if end != -1 else len(buffer)]
+    return scan_pandas_categorical(line.decode().strip())
+
+
+def scan_pandas_categorical(line):
+    """
+    Scans the 'pandas_categorical:XXXXX' line into a list of lists. ``null`` is returned as an empty list.
+    """
+    pandas_categorical = json.loads(line[len(PANDAS_CATEGORICAL_KEY) :])
+    if pandas_categorical is None:
+        pandas_categorical = []
+    return pandas_categorical
+
+
 def _scan_tree(lines):
     struct = _scan_block(lines, TREE_SCAN_KEYS)
     return struct
 
 
-def _get_next_block_of_lines(file):
-    # the only function where the position inside the file is advanced
-    result = []
-    line = file.readline()
-    while line == "\n":
-        line = file.readline()
-    while line != "\n" and line != "":
-        result.append(line.strip())
-        line = file.readline()
-    return result
+def _read_blocks(lines):
+    # blocks are separated by empty lines, the only function where the position inside the file is advanced
+    block = []
+    for line in lines:
+        line = line.strip()
+        if line:
+            block.append(line)
+        elif block:
+            yield block
+            block = []
+    if block:
+        yield block
 
 
 class ScannedValue:
@@ -68,6 +98,11 @@ class ScannedValue:
         self.is_list = is_list
         self.null_ok = null_ok
 
+    @property
+    def is_ndarray(self):
+        # lists of numpy scalar types are scanned into an ndarray of that dtype
+        return self.is_list and issubclass(self.type, np.generic)
+
 
 INPUT_SCAN_KEYS = {
     "max_feature_idx": ScannedValue(int),
@@ -82,17 +117,56 @@ TREE_SCAN_KEYS = {
     "Tree": ScannedValue(int),
     "num_leaves": ScannedValue(int),
     "num_cat": ScannedValue(int),
-    "split_feature": ScannedValue(int, True),
-    "threshold": ScannedValue(float, True),
-    "decision_type": ScannedValue(int, True),
-    "left_child": ScannedValue(int, True),
-    "right_child": ScannedValue(int, True),
-    "leaf_value": ScannedValue(float, True),
-    "cat_threshold": ScannedValue(int, True, True),
-    "cat_boundaries": ScannedValue(int, True, True),
+    "split_feature": ScannedValue(np.int32, True),
+    "threshold": ScannedValue(np.float64, True),
+    "decision_type": ScannedValue(np.int32, True),
+    "left_child": ScannedValue(np.int32, True),
+    "right_child": ScannedValue(np.int32, True),
+    "leaf_value": ScannedValue(np.float64, True),
+    # LightGBM stores the categorical bitsets as uint32
+    "cat_threshold": ScannedValue(np.uint32, True, True),
+    "cat_boundaries": ScannedValue(np.int32, True, True),
 }
 
 
+def _scan_ndarray(value: str, dtype):
+    """
+    Scans a space-separated list of numbers into an ndarray. Raises ValueError for malformed values,
+    as long as DeprecationWarnings are turned into errors (see scan_model_file).
+    Integers are scanned as int64, see _narrow_int_arrays.
+    """
+    is_integer = issubclass(dtype, np.integer)
+    try:
+        parsed = np.fromstring(value, dtype=np.int64 if is_integer else dtype, sep=" ")
+    except DeprecationWarning:
+        raise ValueError(f"Malformed value: {value}") from None
+    if len(parsed) != (value.count(" ") + 1 if value else 0):
+        raise ValueError(f"Malformed value: {value}")
+    return parsed
+
+
+def _narrow_int_arrays(trees):
+    """
+    Converts the int64 arrays of all trees to their scan type.
+
+    numpy silently wraps integers that are out of range, so the range is checked first.
+    Checking all trees at once is much cheaper than checking each small array by itself.
+    """
+    for key, scanned_value in TREE_SCAN_KEYS.items():
+        if not (
+            scanned_value.is_ndarray and issubclass(scanned_value.type, np.integer)
+        ):
+            continue
+        arrays = [tree[key] for tree in trees if key in tree]
+        values = np.concatenate(arrays) if arrays else ()
+        info = np.iinfo(scanned_value.type)
+        if len(values) and (values.min() < info.min or values.max() > info.max):
+            raise ValueError(f"Value of {key} out of range for {info.dtype}")
+        for tree in trees:
+            if key in tree:
+                tree[key] = tree[key].astype(scanned_value.type)
+
+
 def _scan_block(lines: list, items_to_scan: dict):
     """
     Scans a block (= list of lines) into a key: value map.
@@ -107,21 +181,20 @@ def _scan_block(lines: list, items_to_scan: dict):
         if line == "tree":
             continue
 
-        line_split = line.split("=")
-        if len(line_split) == 2:
-            scanned_key, scanned_value = line.split("=")
-        else:
-            assert len(line_split) == 1, f"Unexpected line {line}"
-            scanned_key, scanned_value = line_split[0], True
+        scanned_key, sep, scanned_value = line.partition("=")
+        if not sep:
+            scanned_value = True
 
         target_type = items_to_scan.get(scanned_key)
         if target_type is None:
             continue
         if target_type.is_list:
-            if scanned_value:
-                parsed_value = [target_type.type(x) for x in scanned_value.split(" ")]
-            else:
+            if target_type.is_ndarray:
+                parsed_value = _scan_ndarray(scanned_value, target_type.type)
+            elif not scanned_value:
                 parsed_value = []
+            else:
+                parsed_value = [target_type.type(x) for x in scanned_value.split(" ")]
         else:
             parsed_value = target_type.type(scanned_value)
         result_map[scanned_key] = parsed_value
@@ -1,7 +1,10 @@
+import math
 from dataclasses import dataclass
 
+import numpy as np
 from llvmlite import ir
 
+from lleaves.compiler.ast.nodes import is_leaf
 from lleaves.compiler.utils import ISSUE_ERROR_MSG, MissingType
 
 BOOL = ir.IntType(bits=1)
@@ -13,6 +16,12 @@ LONG = ir.IntType(bits=64)
 ZERO_V = ir.Constant(BOOL, 0)
 FLOAT_PTR = ir.PointerType(FLOAT)
 DOUBLE_PTR = ir.PointerType(DOUBLE)
+INT8_PTR = ir.PointerType(ir.IntType(bits=8))
+
+CAT_BITSET_SUFFIX = "_cat_bitset_comp"
+CACHE_LINE_BYTES = 64
+# number of rows to prefetch ahead of the current row when fprefetch is enabled
+PREFETCH_DISTANCE = 4
 
 
 def iconst(value):
@@ -49,7 +58,17 @@ class LTree:
     class_id: int
 
 
-def gen_forest(forest, module, fblocksize, froot_func_name, use_fp64):
+def gen_forest(
+    forest,
+    module,
+    fblocksize,
+    froot_func_name,
+    use_fp64,
+    node_layout="dfs",
+    fprefetch=False,
+    fbranchless_depth=1,
+    prefer_vector_width=None,
+):
     """
     Populate the passed IR module with code for the forest.
 
@@ -83,6 +102,10 @@ def gen_forest(forest, module, fblocksize, froot_func_name, use_fp64):
     - Leaf node: 0-1 Blocks. If a decision node has only leaves as children we fuse both leaves into
       a single switch instr in the decision node's block.
     Each node cbranches to the child node's block.
+    Subtrees with at most fbranchless_depth levels of numerical decision nodes get no blocks of their own:
+    All their comparisons are evaluated and the result is picked through a tree of select instructions.
+    The blocks are emitted in the order the tree is traversed (node_layout="dfs"),
+    or in van Emde Boas order (node_layout="veb").
 
     :return: None
     """
@@ -94,6 +117,14 @@ def gen_forest(forest, module, fblocksize, froot_func_name, use_fp64):
         ir.FunctionType(ir.VoidType(), (DTYPE_PTR, DTYPE_PTR, INT, INT)),
         name=froot_func_name,
     )
+    # The data array and the results array never alias. This allows LLVM to reorder
+    # loads from the data array around stores to the results array.
+    for arg in root_func.args[:2]:
+        arg.add_attribute("noalias")
+        arg.add_attribute("nocapture")
+    if prefer_vector_width is not None:
+        # overrides the target's tuning, eg 'prefer-256-bit' on AVX-512 CPUs
+        _add_string_attribute(root_func, "prefer-vector-width", prefer_vector_width)
 
     def make_tree(tree):
         # declare the function for this tree
@@ -104,7 +135,7 @@ def gen_forest(forest, module, fblocksize, froot_func_name, use_fp64):
         tree_func = ir.Function(module, scalar_func_t, name=str(tree))
         tree_func.linkage = "private"
         # populate function with IR
-        gen_tree(tree, tree_func, use_fp64)
+        gen_tree(tree, tree_func, use_fp64, node_layout, fbranchless_depth)
         return LTree(llvm_function=tree_func, class_id=tree.class_id)
 
     tree_funcs = [make_tree(tree) for tree in forest.trees]
@@ -113,63 +144,152 @@ def gen_forest(forest, module, fblocksize, froot_func_name, use_fp64):
         # better locality by running trees for each class together
         tree_funcs.sort(key=lambda t: t.class_id)
 
-    _populate_forest_func(forest, root_func, tree_funcs, fblocksize, use_fp64)
+    _populate_forest_func(
+        forest, root_func, tree_funcs, fblocksize, use_fp64, fprefetch
+    )
 
 
-def gen_tree(tree, tree_func, use_fp64):
+def _add_string_attribute(func, key, value):
+    """
+    Add the string attribute ``"key"="value"`` to the function.
+
+    llvmlite's FunctionAttributes only accepts the enum attributes from a fixed list and has no API for
+    string attributes. Its entries are emitted into the IR verbatim, so the attribute is added to the
+    underlying set directly, bypassing the name check.
+    """
+    attr = f'"{key}"="{value}"'
+    set.add(func.attributes, attr)
+    # fail loudly instead of silently dropping the attribute if llvmlite changes how attributes are emitted
+    assert attr in str(func), f"llvmlite didn't emit function attribute {attr}"
+
+
+def gen_tree(tree, tree_func, use_fp64, node_layout="dfs", fbranchless_depth=1):
     """generate code for tree given the function, recursing into nodes"""
-    node_block = tree_func.append_basic_block(name=str(tree.root_node))
-    gen_node(tree_func, node_block, tree.root_node, use_fp64)
+    node_block = tree_func.append_basic_block(name=_node_name(tree.root))
+    gen_node(tree_func, node_block, tree, tree.root, use_fp64, fbranchless_depth)
+    if node_layout == "veb":
+        _reorder_blocks_veb(tree_func, tree)
+
 
+def _reorder_blocks_veb(tree_func, tree):
+    """reorder the tree's blocks so the nodes at the top of the tree share cache lines"""
+    position = {_node_name(node): pos for pos, node in enumerate(tree.veb_order())}
 
-def gen_node(func, node_block, node, use_fp64):
+    def block_position(block):
+        # a categorical node's bitset-comparison block directly follows the node's block
+        is_bitset_comp = block.name.endswith(CAT_BITSET_SUFFIX)
+        name = block.name[: -len(CAT_BITSET_SUFFIX)] if is_bitset_comp else block.name
+        return position[name], is_bitset_comp
+
+    tree_func.blocks.sort(key=block_position)
+
+
+def _node_name(node):
+    return f"leaf_{~node}" if is_leaf(node) else f"node_{node}"
+
+
+def gen_node(func, node_block, tree, node, use_fp64, fbranchless_depth=1):
     """generate code for node, recursing into children"""
-    if node.is_leaf:
-        _gen_leaf_node(node_block, node, use_fp64)
+    if is_leaf(node):
+        _gen_leaf_node(node_block, tree.leaf_value[~node], use_fp64)
+    elif _is_branchless_subtree(tree, node, fbranchless_depth):
+        builder = ir.IRBuilder(node_block)
+        builder.ret(_populate_branchless_subtree(func, builder, tree, node, use_fp64))
     else:
-        _gen_decision_node(func, node_block, node, use_fp64)
+        _gen_decision_node(func, node_block, tree, node, use_fp64, fbranchless_depth)
+
+
+def _is_branchless_subtree(tree, node, max_depth):
+    """True if the subtree has at most max_depth levels of decision nodes, none of them categorical"""
+    if is_leaf(node):
+        return True
+    if max_depth == 0 or tree.nodes.get_decision_type(node).is_categorical:
+        return False
+    return all(
+        _is_branchless_subtree(tree, child, max_depth - 1)
+        for child in tree.children(node)
+    )
 
 
-def _gen_leaf_node(node_block, leaf, use_fp64):
+def _populate_branchless_subtree(func, builder, tree, node, use_fp64):
+    """populate block with the comparisons of all nodes in the subtree, selecting the leaf value"""
+    if is_leaf(node):
+        return get_fdtype_const(tree.leaf_value[~node], use_fp64)
+    comp = _populate_numerical_node_block(
+        func,
+        builder,
+        int(tree.nodes.split_feature[node]),
+        float(tree.nodes.threshold[node]),
+        tree.nodes.get_decision_type(node),
+        use_fp64,
+    )
+    left, right = tree.children(node)
+    return builder.select(
+        comp,
+        _populate_branchless_subtree(func, builder, tree, left, use_fp64),
+        _populate_branchless_subtree(func, builder, tree, right, use_fp64),
+    )
+
+
+def _gen_leaf_node(node_block, leaf_value, use_fp64):
     """populate block with leaf's return value"""
     builder = ir.IRBuilder(node_block)
-    builder.ret(get_fdtype_const(leaf.value, use_fp64))
+    builder.ret(get_fdtype_const(leaf_value, use_fp64))
 
 
-def _gen_decision_node(func, node_block, node, use_fp64):
+def _gen_decision_node(func, node_block, tree, node, use_fp64, fbranchless_depth):
     """generate code for decision node, recursing into children"""
     builder = ir.IRBuilder(node_block)
+    nodes = tree.nodes
+    left = int(nodes.left[node])
+    right = int(nodes.right[node])
+    decision_type = nodes.get_decision_type(node)
 
     # optimization for node where both children are leaves (switch instead of cbranch)
-    is_fused_double_leaf_node = node.left.is_leaf and node.right.is_leaf
+    is_fused_double_leaf_node = is_leaf(left) and is_leaf(right)
     if is_fused_double_leaf_node:
         left_block = None
         right_block = None
         # categorical nodes have a fastpath which can branch-right early
         # so they still need a right block
-        if node.decision_type.is_categorical:
-            right_block = func.append_basic_block(name=str(node.right))
+        if decision_type.is_categorical:
+            right_block = func.append_basic_block(name=_node_name(right))
     else:
-        left_block = func.append_basic_block(name=str(node.left))
-        right_block = func.append_basic_block(name=str(node.right))
+        left_block = func.append_basic_block(name=_node_name(left))
+        right_block = func.append_basic_block(name=_node_name(right))
 
     # populate this node's block up to the terminal statement
-    if node.decision_type.is_categorical:
-        bitset_comp_block = builder.append_basic_block(str(node) + "_cat_bitset_comp")
+    if decision_type.is_categorical:
+        bitset_comp_block = builder.append_basic_block(
+            _node_name(node) + CAT_BITSET_SUFFIX
+        )
         bitset_builder = ir.IRBuilder(bitset_comp_block)
         comp = _populate_categorical_node_block(
-            func, builder, bitset_builder, node, bitset_comp_block, right_block
+            func,
+            builder,
+            bitset_builder,
+            int(nodes.split_feature[node]),
+            nodes.get_cat_threshold(node),
+            bitset_comp_block,
+            right_block,
         )
         builder = bitset_builder
     else:
-        comp = _populate_numerical_node_block(func, builder, node, use_fp64)
+        comp = _populate_numerical_node_block(
+            func,
+            builder,
+            int(nodes.split_feature[node]),
+            float(nodes.threshold[node]),
+            decision_type,
+            use_fp64,
+        )
 
     # finalize this node's block with a terminal statement
     if is_fused_double_leaf_node:
         ret = builder.select(
             comp,
-            get_fdtype_const(node.left.value, use_fp64),
-            get_fdtype_const(node.right.value, use_fp64),
+            get_fdtype_const(tree.leaf_value[~left], use_fp64),
+            get_fdtype_const(tree.leaf_value[~right], use_fp64),
         )
         builder.ret(ret)
     else:
@@ -177,9 +297,9 @@ def _gen_decision_node(func, node_block, node, use_fp64):
 
     # populate generated child blocks
     if left_block:
-        gen_node(func, left_block, node.left, use_fp64)
+        gen_node(func, left_block, tree, left, use_fp64, fbranchless_depth)
     if right_block:
-        gen_node(func, right_block, node.right, use_fp64)
+        gen_node(func, right_block, tree, right, use_fp64, fbranchless_depth)
 
 
 def _populate_instruction_block(
@@ -191,6 +311,7 @@ def _populate_instruction_block(
     next_block,
     eval_obj_func,
     use_fp64,
+    fprefetch=False,
 ):
     """Generates an instruction_block: loops over all input data and evaluates its chunk of tree_funcs."""
     data_arr, out_arr, start_index, end_index = root_func.args
@@ -222,6 +343,8 @@ def _populate_instruction_block(
     iter_mul_nargs = builder.mul(loop_iter_reg, n_args)
     idx = (builder.add(iter_mul_nargs, lconst(i)) for i in range(forest.n_args))
     raw_ptrs = [builder.gep(root_func.args[0], (c,)) for c in idx]
+    if fprefetch:
+        _populate_prefetch(builder, data_arr, iter_mul_nargs, forest.n_args, use_fp64)
     # cast the categorical inputs to integer
     for feature, ptr in zip(forest.features, raw_ptrs):
         el = builder.load(ptr)
@@ -233,7 +356,9 @@ def _populate_instruction_block(
             args.append(el)
         else:
             args.append(el)
-    # iterate over each tree, sum up results
+    # iterate over each tree, sum up results.
+    # The sums are kept in registers and stored once per row. They are added up in tree order without
+    # fast-math flags, reassociating the additions would change the result compared to LightGBM.
     results = [get_fdtype_const(0.0, use_fp64) for _ in range(forest.n_classes)]
     for func in tree_funcs:
         tree_res = builder.call(func.llvm_function, args)
@@ -269,7 +394,32 @@ def _populate_instruction_block(
     # -- END CORE LOOP BLOCK
 
 
-def _populate_forest_func(forest, root_func, tree_funcs, fblocksize, use_fp64):
+def _populate_prefetch(builder, data_arr, row_offset, n_args, use_fp64):
+    """
+    Prefetch the row that is evaluated PREFETCH_DISTANCE iterations from now, one prefetch per cache line.
+
+    Prefetches are only hints and never fault, so running past the end of the data array is fine.
+    """
+    llvm_prefetch = builder.module.declare_intrinsic(
+        "llvm.prefetch", fnty=ir.FunctionType(ir.VoidType(), (INT8_PTR, INT, INT, INT))
+    )
+    row_bytes = n_args * (8 if use_fp64 else 4)
+    elements_per_line = CACHE_LINE_BYTES // (8 if use_fp64 else 4)
+    prefetch_offset = builder.add(row_offset, lconst(PREFETCH_DISTANCE * n_args))
+    for line in range(math.ceil(row_bytes / CACHE_LINE_BYTES)):
+        ptr = builder.gep(
+            data_arr, (builder.add(prefetch_offset, lconst(line * elements_per_line)),)
+        )
+        # read access, high temporal locality, data cache
+        builder.call(
+            llvm_prefetch,
+            (builder.bitcast(ptr, INT8_PTR), iconst(0), iconst(3), iconst(1)),
+        )
+
+
+def _populate_forest_func(
+    forest, root_func, tree_funcs, fblocksize, use_fp64, fprefetch=False
+):
     """Populate root function IR for forest"""
 
     assert fblocksize > 0
@@ -295,6 +445,7 @@ def _populate_forest_func(forest, root_func, tree_funcs, fblocksize, use_fp64):
             next_block,
             eval_objective_func,
             use_fp64,
+            fprefetch,
         )
 
 
@@ -389,10 +540,16 @@ def _populate_objective_func_block(
 
 
 def _populate_categorical_node_block(
-    func, builder, bitset_comp_builder, node, bitset_comp_block, right_block
+    func,
+    builder,
+    bitset_comp_builder,
+    split_feature,
+    cat_threshold,
+    bitset_comp_block,
+    right_block,
 ):
     """Populate block with IR for categorical node"""
-    val = func.args[node.split_feature]
+    val = func.args[split_feature]
 
     # For categoricals, processing NaNs happens in the Forest root, by explicitly checking for them
     # NaNs are converted to negative max_val, which never exists in the Bitset, so they always go right
@@ -402,14 +559,14 @@ def _populate_categorical_node_block(
     comp = builder.icmp_unsigned(
         "<",
         val,
-        iconst(32 * len(node.cat_threshold)),
+        iconst(32 * len(cat_threshold)),
     )
     builder.cbranch(comp, bitset_comp_block, right_block)
 
     idx = bitset_comp_builder.udiv(val, iconst(32))
     bit_vecs = ir.Constant(
-        ir.VectorType(INT, len(node.cat_threshold)),
-        [ir.Constant(INT, i) for i in node.cat_threshold],
+        ir.VectorType(INT, len(cat_threshold)),
+        [ir.Constant(INT, i) for i in cat_threshold],
     )
     shift = bitset_comp_builder.urem(val, iconst(32))
     # pick relevant bitvector
@@ -420,13 +577,32 @@ def _populate_categorical_node_block(
     return comp
 
 
-def _populate_numerical_node_block(func, builder, node, use_fp64):
+def _round_down_to_fp32(threshold):
+    """
+    Returns the largest fp32 value that is <= threshold.
+
+    LightGBM compares in fp64. For any fp32 value x, ``x <= threshold`` is equivalent to
+    ``x <= _round_down_to_fp32(threshold)``, which round-to-nearest wouldn't guarantee.
+    """
+    with np.errstate(over="ignore"):
+        # thresholds outside of fp32's range become +-inf
+        thresh_fp32 = np.float32(threshold)
+    if thresh_fp32 > threshold:
+        thresh_fp32 = np.nextafter(thresh_fp32, np.float32(-np.inf))
+    return float(thresh_fp32)
+
+
+def _populate_numerical_node_block(
+    func, builder, split_feature, threshold, decision_type, use_fp64
+):
     """populate block with IR for numerical node"""
-    val = func.args[node.split_feature]
+    val = func.args[split_feature]
 
     DTYPE = get_fdtype(use_fp64)
-    thresh = ir.Constant(DTYPE, node.threshold)
-    missing_t = node.decision_type.missing_type
+    thresh = ir.Constant(
+        DTYPE, threshold if use_fp64 else _round_down_to_fp32(threshold)
+    )
+    missing_t = decision_type.missing_type
 
     # If missingType != MNaN, LightGBM treats NaNs values as if they were 0.0.
     # So for MZero, NaNs get treated like missing values.
@@ -434,15 +610,15 @@ def _populate_numerical_node_block(func, builder, node, use_fp64):
     # default_left decides where to go when a missing value is encountered
     # for MNone handle NaNs by adjusting default_left to make sure NaNs go where 0.0 would have gone.
     # for MZero we handle NaNs in the IR
-    if node.decision_type.missing_type == MissingType.MNone:
-        default_left = node.threshold >= 0.0
+    if decision_type.missing_type == MissingType.MNone:
+        default_left = threshold >= 0.0
     else:
-        default_left = node.decision_type.is_default_left
+        default_left = decision_type.is_default_left
 
     # MissingType.MZero: Treat 0s (and NaNs) as missing values
     if default_left:
         if missing_t != MissingType.MZero or (
-            missing_t == MissingType.MZero and node.threshold >= 0.0
+            missing_t == MissingType.MZero and threshold >= 0.0
         ):
             # unordered cmp: we'll get True (and go left) if any arg is qNaN
             comp = builder.fcmp_unordered("<=", val, thresh)
@@ -454,7 +630,7 @@ def _populate_numerical_node_block(func, builder, node, use_fp64):
             comp = builder.or_(is_missing, less_eq)
     else:
         if missing_t != MissingType.MZero or (
-            missing_t == MissingType.MZero and node.threshold < 0.0
+            missing_t == MissingType.MZero and threshold < 0.0
         ):
             # ordered cmp: we'll get False (and go right) if any arg is qNaN
             comp = builder.fcmp_ordered("<=", val, thresh)
@@ -14,12 +14,26 @@ def compile_to_module(
     raw_score=False,
     froot_func_name="forest_root",
     use_fp64=True,
+    prefer_vector_width=None,
+    node_layout="dfs",
+    fprefetch=False,
+    fbranchless_depth=1,
 ):
     forest = parse_to_ast(file_path)
     forest.raw_score = raw_score
 
     ir = llvmlite.ir.Module(name="forest")
-    gen_forest(forest, ir, fblocksize, froot_func_name, use_fp64)
+    gen_forest(
+        forest,
+        ir,
+        fblocksize,
+        froot_func_name,
+        use_fp64,
+        node_layout,
+        fprefetch,
+        fbranchless_depth,
+        prefer_vector_width,
+    )
 
     ir.triple = llvm.get_process_triple()
     module = llvm.parse_assembly(str(ir))
@@ -1,12 +1,14 @@
-import json
-import os
+import mmap
 from ctypes import POINTER, c_double, c_float
 from typing import List, Optional
 
 import numpy as np
 
+from lleaves.compiler.ast.scanner import find_pandas_categorical
+
 try:
     from pandas import DataFrame as pd_DataFrame
+    from pandas import Index as pd_Index
 except ImportError:
 
     class pd_DataFrame:
@@ -14,8 +16,15 @@ except ImportError:
 
         pass
 
+    class pd_Index:
+        """Dummy class for pandas.Index."""
+
+        pass
 
-def _dataframe_to_ndarray(data: pd_DataFrame, pd_traintime_categories: List[List]):
+
+def _dataframe_to_ndarray(
+    data: pd_DataFrame, pd_traintime_categories: List[List], dtype=None
+):
     """
     Converts the given dataframe into a 2D numpy array and converts categorical columns to float.
 
@@ -28,6 +37,7 @@ def _dataframe_to_ndarray(data: pd_DataFrame, pd_traintime_categories: List[List
 
         Example (two columns with two categories each): ``[["a", "b"], ["b", "a"]]``.
         These columns are different and will result in two different mappings ("a" -> 0.0 vs "a" -> 1.0).
+    :param dtype: If given, the dataframe is converted to this dtype in a single pass.
     :return: 2D np.ndarray, dtype float64 or float32
     """
     cat_cols = list(data.select_dtypes(include=["category"]).columns)
@@ -38,21 +48,45 @@ def _dataframe_to_ndarray(data: pd_DataFrame, pd_traintime_categories: List[List
         )
     if len(cat_cols):
         data = data.copy()
-        for col, category in zip(cat_cols, pd_traintime_categories):
+        for col, category in zip(
+            cat_cols, categories_to_index(pd_traintime_categories)
+        ):
             # we use set_categories to get the same (category -> code) mapping that we used during train
-            if list(data[col].cat.categories) != list(category):
+            if not data[col].cat.categories.equals(category):
                 data[col] = data[col].cat.set_categories(category)
         # apply (category -> code) mapping. Categories become floats
         data[cat_cols] = (
             data[cat_cols].apply(lambda x: x.cat.codes).replace({-1: np.nan})
         )
+    if dtype is not None:
+        return data.to_numpy(dtype=dtype)
     data = data.values
     if data.dtype != np.float64 and data.dtype != np.float32:
         data = data.astype(np.float64)
     return data
 
 
-def data_to_ndarray(data, pd_traintime_categories: Optional[List[List]] = None):
+def categories_to_index(pd_traintime_categories: List[List]):
+    """
+    Converts each column's list of train-time categories into a ``pandas.Index``.
+
+    Comparing a dataframe's categories against an Index runs in C, comparing against a list requires
+    converting the categories to a Python list first. Do this once and pass the result to
+    :func:`lleaves.data_processing.data_to_ndarray` to avoid the conversion on every call.
+    Columns that are already an Index are kept as is. Requires pandas.
+
+    :param pd_traintime_categories: For each categorical column, a list of its categories.
+    :return: list of pandas.Index
+    """
+    return [
+        category if isinstance(category, pd_Index) else pd_Index(category)
+        for category in pd_traintime_categories
+    ]
+
+
+def data_to_ndarray(
+    data, pd_traintime_categories: Optional[List[List]] = None, dtype=None
+):
     """
     Convert the given data to a numpy ndarray
 
@@ -76,16 +110,20 @@ def data_to_ndarray(data, pd_traintime_categories: Optional[List[List]] = None):
         the number of categorical columns needs to equal ``len(pd_traintime_categories)``.
     :param pd_traintime_categories: For each categorical column in dataframe, a list of its categories.
         The ordering of columns and of categories within each column should match the training dataset.
-        Ignored if data is not a pandas DataFrame.
+        Ignored if data is not a pandas DataFrame. Passing the output of
+        :func:`lleaves.data_processing.categories_to_index` avoids converting the categories on every call.
+    :param dtype: Optional target dtype. Pandas dataframes and Python lists are converted to it directly,
+        which avoids a second copy when casting later. Numpy arrays are only copied if their dtype differs.
 
     :return: numpy ndarray
     """
     if isinstance(data, np.ndarray):
-        data = data
+        if dtype is not None:
+            data = data.astype(dtype, copy=False, casting="same_kind")
     elif isinstance(data, pd_DataFrame):
-        data = _dataframe_to_ndarray(data, pd_traintime_categories)
+        data = _dataframe_to_ndarray(data, pd_traintime_categories, dtype)
     elif isinstance(data, list):
-        data = np.array(data, dtype=np.float64)
+        data = np.array(data, dtype=np.float64 if dtype is None else dtype)
     else:
         raise ValueError(
             f"Expecting numpy.ndarray, pandas.DataFrame or Python list, got {type(data)}"
@@ -115,7 +153,7 @@ def ndarray_to_ptr(data: np.ndarray, use_fp64: bool = True):
 
 def extract_pandas_traintime_categories(file_path):
     """
-    Scan the model.txt from the back to extract the 'pandas_categorical' field.
+    Search the model.txt from the back to extract the 'pandas_categorical' field.
 
     This is a list of lists that stores the ordering of categories from the pd.DataFrame used for training.
     Storing this list is necessary as LightGBM encodes categories as integer indices and we need to guarantee that
@@ -129,33 +167,18 @@ def extract_pandas_traintime_categories(file_path):
     :param file_path: path to model.txt
     :return: list of list. For each pd.categorical column encountered during training, a list of the categories.
     """
-    pandas_key = "pandas_categorical:"
-    max_offset = os.path.getsize(file_path)
-    stepsize = min(1024, max_offset - 1)
-    current_offset = stepsize
-    lines = []
-    # seek backwards from end of file until we have two lines
-    # the (pen)ultimate line should be pandas_categorical:XXX
-    with open(file_path, "rb") as f:
-        while len(lines) < 2 and current_offset < max_offset:
-            if current_offset > max_offset:
-                current_offset = max_offset
-            # read <current_offset>-many Bytes from end of file
-            f.seek(-current_offset, os.SEEK_END)
-            lines = f.readlines()
-            current_offset *= 2
-
-    # pandas_categorical has to be present in the ultimate or penultimate line. Else the model.txt is malformed.
-    if len(lines) >= 2:
-        last_line = lines[-1].decode().strip()
-        if not last_line.startswith(pandas_key):
-            last_line = lines[-2].decode().strip()
-        if last_line.startswith(pandas_key):
-            pandas_categorical = json.loads(last_line[len(pandas_key) :])
-            if pandas_categorical is None:
-                pandas_categorical = []
-            return pandas_categorical
-    raise ValueError("Ill formatted model file!")
+    try:
+        with open(file_path, "rb") as f, mmap.mmap(
+            f.fileno(), 0, access=mmap.ACCESS_READ
+        ) as buffer:
+            # the search starts at the end of the file, where pandas_categorical is located
+            pandas_categorical = find_pandas_categorical(buffer)
+    except ValueError:
+        # mmap raises for empty files, json for a malformed pandas_categorical line
+        pandas_categorical = None
+    if pandas_categorical is None:
+        raise ValueError("Ill formatted model file!")
+    return pandas_categorical
 
 
 def extract_model_global_features(file_path):
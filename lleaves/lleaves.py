@@ -1,6 +1,7 @@
 import concurrent.futures
 import math
 import os
+import threading
 from ctypes import CFUNCTYPE, POINTER, c_double, c_float, c_int32
 from pathlib import Path
 
@@ -9,12 +10,18 @@ import numpy as np
 
 from lleaves import compiler
 from lleaves.data_processing import (
+    categories_to_index,
     data_to_ndarray,
     extract_model_global_features,
     extract_pandas_traintime_categories,
     ndarray_to_ptr,
+    pd_DataFrame,
 )
-from lleaves.llvm_binding import compile_module_to_asm
+from lleaves.llvm_binding import compile_module_to_asm, get_bitcode_cache_path
+
+# Minimum amount of work (rows * trees) for each thread during prediction.
+# Dispatching a batch to the thread pool takes several microseconds, smaller batches don't pay off.
+MIN_TREE_EVALUATIONS_PER_JOB = 2**16
 
 
 def get_entry_func_type(use_fp64: bool):
@@ -28,6 +35,11 @@ def get_entry_func_type(use_fp64: bool):
     )
 
 
+def _predict_chunk(func, ptr_data, ptr_preds, start_idx, end_idx):
+    # module-level to avoid creating a closure for every submitted batch
+    func(ptr_data, ptr_preds, start_idx, end_idx)
+
+
 class Model:
     """
     The base class of lleaves.
@@ -45,6 +57,9 @@ class Model:
     # prediction function, drops GIL on entry
     _c_entry_func = None
 
+    # thread pool for parallel prediction, created lazily and shared by all predict() calls
+    _executor = None
+
     def __init__(self, model_file):
         """
         Initialize the uncompiled model.
@@ -55,8 +70,12 @@ class Model:
         self.model_file = model_file
         self.is_compiled = False
         self.use_fp64 = True
+        # guards creation and shutdown of the thread pool
+        self._executor_lock = threading.Lock()
 
         self._pandas_categorical = extract_pandas_traintime_categories(model_file)
+        # pandas.Index of the categories, built once on the first prediction on a dataframe
+        self._pandas_categorical_index = None
         num_attrs = extract_model_global_features(model_file)
         self._n_feature = num_attrs["n_feature"]
         self._n_classes = num_attrs["n_class"]
@@ -94,6 +113,10 @@ class Model:
         use_fp64=True,
         target_cpu=None,
         target_cpu_features=None,
+        prefer_vector_width=None,
+        node_layout="dfs",
+        fprefetch=False,
+        fbranchless_depth=1,
     ):
         """
         Generate the LLVM IR for this model and compile it to ASM.
@@ -104,6 +127,8 @@ class Model:
 
         :param cache: Path to a cache file. If this path doesn't exist, binary will be dumped at path after compilation.
             If path exists, binary will be loaded and compilation skipped.
+            Additionally the optimized LLVM IR is dumped as bitcode to `<cache>.bc`. If only the bitcode exists,
+            it is loaded and just the generation of the binary is run.
             No effort is made to check staleness / consistency.
         :param raw_score: If true, compile the tree to always return raw predictions, without applying
             the objective function. Equivalent to the `raw_score` parameter of LightGBM's Booster.predict().
@@ -123,12 +148,34 @@ class Model:
             cpu name).
         :param target_cpu_features: An optional string specifying the target CPU features to enable (defaults to the
             host's CPU features).
+        :param prefer_vector_width: An optional integer specifying the preferred vector width in bits (eg 512).
+            This is passed to LLVM as a function attribute of the root function and overrides the target's tuning.
+        :param node_layout: The order in which each tree's nodes are laid out in the binary. One of {"dfs", "veb"}.
+            "dfs" follows the traversal order of the tree. "veb" uses a cache-oblivious van Emde Boas layout,
+            which places the upper levels of the tree next to each other and may reduce icache misses for deep trees.
+        :param fprefetch: If true, software-prefetch the input rows a few iterations ahead of the row being predicted.
+            Can help hide memory latency for wide inputs that don't fit into cache.
+        :param fbranchless_depth: Subtrees with at most this many levels of numerical decision nodes are compiled
+            without branches: All their comparisons are evaluated and the leaf is picked using select instructions.
+            Avoids branch mispredictions for splits that are hard to predict, at the cost of evaluating more nodes.
+            The default of 1 only makes the last decision before the leaves branchless.
         """
         assert fblocksize > 0
         assert fcodemodel in ("small", "large")
+        assert prefer_vector_width is None or prefer_vector_width > 0
+        assert node_layout in ("dfs", "veb")
+        assert fbranchless_depth >= 1
         self.use_fp64 = use_fp64
 
-        if cache is None or not Path(cache).exists():
+        if cache is not None and Path(cache).exists():
+            # when loading binary from cache we use a dummy empty module
+            module = llvmlite.binding.parse_assembly("")
+        elif cache is not None and get_bitcode_cache_path(cache).exists():
+            # the optimized IR is cached, only the binary needs to be generated
+            module = llvmlite.binding.parse_bitcode(
+                get_bitcode_cache_path(cache).read_bytes()
+            )
+        else:
             module = compiler.compile_to_module(
                 self.model_file,
                 raw_score=raw_score,
@@ -136,10 +183,11 @@ class Model:
                 finline=finline,
                 froot_func_name=froot_func_name,
                 use_fp64=self.use_fp64,
+                prefer_vector_width=prefer_vector_width,
+                node_layout=node_layout,
+                fprefetch=fprefetch,
+                fbranchless_depth=fbranchless_depth,
             )
-        else:
-            # when loading binary from cache we use a dummy empty module
-            module = llvmlite.binding.parse_assembly("")
 
         # keep a reference to the engine to protect it from being garbage-collected
         self._execution_engine = compile_module_to_asm(
@@ -164,8 +212,8 @@ class Model:
 
         :param data: Pandas df, numpy 2D array or Python list. Shape should be (n_rows, model.num_feature()).
             If the datatype is not equal to the model's dtype, the data will be copied. In any case access is read-only.
-        :param n_jobs: Number of threads to use for prediction. Defaults to number of CPUs. For single-row prediction
-            this should be set to 1.
+        :param n_jobs: Number of threads to use for prediction. Defaults to number of CPUs. Small batches are
+            predicted using fewer threads, as splitting them up costs more than it saves.
         :return: 1D numpy array. Datatype is fp64/fp32, depending on the `use_fp64` flag passed to .compile()
         """
         if n_jobs is None:
@@ -176,8 +224,13 @@ class Model:
                 "Functionality only available after compilation. Run model.compile()."
             )
 
-        # convert all input types to numpy arrays
-        data = data_to_ndarray(data, self._pandas_categorical)
+        dtype = np.float64 if self.use_fp64 else np.float32
+        if isinstance(data, pd_DataFrame) and self._pandas_categorical_index is None:
+            self._pandas_categorical_index = categories_to_index(
+                self._pandas_categorical
+            )
+        # convert all input types to numpy arrays of the model's dtype
+        data = data_to_ndarray(data, self._pandas_categorical_index, dtype=dtype)
         n_predictions = data.shape[0]
         if len(data.shape) != 2 or data.shape[1] != self.num_feature():
             raise ValueError(
@@ -196,24 +249,59 @@ class Model:
         pred_shape = (
             n_predictions if self._n_classes == 1 else (n_predictions, self._n_classes)
         )
-        predictions = np.zeros(
-            pred_shape, dtype=np.float64 if self.use_fp64 else np.float32
-        )
+        # no need to zero-initialize, the compiled function writes every prediction
+        predictions = np.empty(pred_shape, dtype=dtype)
         ptr_preds = ndarray_to_ptr(predictions, use_fp64=self.use_fp64)
 
-        if n_jobs == 1:
+        batchsize = max(
+            math.ceil(n_predictions / n_jobs),
+            math.ceil(MIN_TREE_EVALUATIONS_PER_JOB / max(self._n_trees, 1)),
+        )
+        if batchsize >= n_predictions:
             self._c_entry_func(ptr_data, ptr_preds, 0, n_predictions)
         else:
-            batchsize = math.ceil(n_predictions / n_jobs)
-            with concurrent.futures.ThreadPoolExecutor(max_workers=n_jobs) as executor:
-                for i in range(0, n_predictions, batchsize):
-                    executor.submit(
-                        lambda start_idx: self._c_entry_func(
-                            ptr_data,
-                            ptr_preds,
-                            start_idx,
-                            min(start_idx + batchsize, n_predictions),
-                        ),
-                        i,
-                    )
+            executor = self._get_executor()
+            # at most n_jobs - 1 batches are submitted, the first one is predicted by the calling thread
+            futures = [
+                executor.submit(
+                    _predict_chunk,
+                    self._c_entry_func,
+                    ptr_data,
+                    ptr_preds,
+                    i,
+                    min(i + batchsize, n_predictions),
+                )
+                for i in range(batchsize, n_predictions, batchsize)
+            ]
+            self._c_entry_func(ptr_data, ptr_preds, 0, batchsize)
+            # wait for all batches to finish, re-raises exceptions from the worker threads
+            for future in futures:
+                future.result()
         return predictions
+
+    def _get_executor(self):
+        # The pool is never replaced while the model is in use, so concurrent predict() calls can share it.
+        # n_jobs only limits how many batches a call submits.
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=os.cpu_count(), thread_name_prefix="lleaves"
+                )
+            return self._executor
+
+    def close(self):
+        """
+        Shut down the thread pool used for parallel prediction.
+
+        The model stays usable, a new thread pool is created on the next multithreaded call to predict().
+        Must not be called while predict() is running in another thread.
+        """
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+    def __del__(self):
+        # the pool (and the lock) may not exist if __init__ failed
+        if self._executor is not None:
+            self.close()
@@ -1,11 +1,14 @@
 import os
+from functools import lru_cache
 from pathlib import Path
 
 import llvmlite.binding as llvm
 
 
+@lru_cache(maxsize=None)
 def _initialize_llvm():
-    # this initializes the per-process LLVM state. It's save to call multiple times.
+    # this initializes the per-process LLVM state. It's save to call multiple times,
+    # but running it once is enough.
     # TODO we never call llvm.shutdown(), is this a problem?
     # some parts of the llvm memory are only deallocated once the process exits
     llvm.initialize()
@@ -13,19 +16,41 @@ def _initialize_llvm():
     llvm.initialize_native_asmprinter()
 
 
+def _unlock_avx512(target_cpu_features):
+    # LLVM tunes most AVX-512 capable CPUs to 'prefer-256-bit', so the zmm registers stay unused.
+    # For the compute-bound prediction loop the wider vectors pay off, hence we opt out of the tuning flag.
+    features = [
+        f for f in target_cpu_features.split(",") if f and f != "+prefer-256-bit"
+    ]
+    if any(f in features for f in ("+avx512f", "+avx512bw", "+avx512vl")):
+        features.append("-prefer-256-bit")
+    return ",".join(features)
+
+
+@lru_cache(maxsize=None)
+def _get_host_cpu():
+    # the host CPU doesn't change while the process is running, so feature detection is done only once
+    target_cpu = llvm.get_host_cpu_name()
+    try:
+        # LLVM raises if features cannot be detected
+        target_cpu_features = llvm.get_host_cpu_features().flatten()
+    except RuntimeError:
+        target_cpu_features = ""
+    else:
+        target_cpu_features = _unlock_avx512(target_cpu_features)
+    return target_cpu, target_cpu_features
+
+
 def _get_target_machine(fcodemodel="large", target_cpu=None, target_cpu_features=None):
     target = llvm.Target.from_triple(llvm.get_process_triple())
 
     if target_cpu is None:
-        target_cpu = llvm.get_host_cpu_name()
+        target_cpu = _get_host_cpu()[0]
 
     if target_cpu_features is None:
-        try:
-            # LLVM raises if features cannot be detected
-            target_cpu_features = llvm.get_host_cpu_features().flatten()
-        except RuntimeError:
-            target_cpu_features = ""
+        target_cpu_features = _get_host_cpu()[1]
 
+    # The target machine is not cached: The execution engine takes ownership of it and frees it on deletion.
     # large codemodel is necessary for large, ~1000 tree models.
     # for smaller models "default" codemodel would be faster.
     target_machine = target.create_target_machine(
@@ -37,6 +62,11 @@ def _get_target_machine(fcodemodel="large", target_cpu=None, target_cpu_features
     return target_machine
 
 
+def get_bitcode_cache_path(cache_path):
+    # the optimized IR is stored as LLVM bitcode next to the cached binary
+    return Path(f"{cache_path}.bc")
+
+
 def compile_module_to_asm(
     module,
     cache_path=None,
@@ -65,6 +95,8 @@ def compile_module_to_asm(
             execution_engine.set_object_cache(
                 notify_func=lambda _, buffer: Path(cache_path).write_bytes(buffer)
             )
+            # the bitcode allows skipping IR generation & optimization if only the binary needs to be rebuilt
+            get_bitcode_cache_path(cache_path).write_bytes(module.as_bitcode())
 
     # compile IR to ASM
     execution_engine.finalize_object()
@@ -1,6 +1,7 @@
 import io
 import os
 from contextlib import redirect_stdout
+from ctypes import POINTER, c_double
 
 import numpy as np
 import pandas as pd
@@ -54,6 +55,25 @@ def test_cache_blocksize(blocksize, NYC_data):
     )
 
 
+@pytest.mark.parametrize("blocksize", [1, 34])
+def test_cache_blocksize_uninitialized_output(blocksize):
+    # predict() doesn't initialize the predictions array. The first cache block overwrites
+    # the garbage, only the following blocks add to the stored results.
+    llvm_model = Model(model_file="tests/models/multiclass/model.txt")
+    lgbm_model = Booster(model_file="tests/models/multiclass/model.txt")
+    llvm_model.compile(fblocksize=blocksize)
+
+    data = np.random.rand(100, llvm_model.num_feature())
+    preds = np.full((100, llvm_model._n_classes), np.nan)
+    llvm_model._c_entry_func(
+        data.ctypes.data_as(POINTER(c_double)),
+        preds.ctypes.data_as(POINTER(c_double)),
+        0,
+        100,
+    )
+    np.testing.assert_almost_equal(preds, lgbm_model.predict(data))
+
+
 def test_small_codemodel(NYC_data):
     llvm_model = Model(model_file="tests/models/NYC_taxi/model.txt")
     lgbm_model = Booster(model_file="tests/models/NYC_taxi/model.txt")
@@ -76,6 +96,35 @@ def test_no_inline(NYC_data):
     )
 
 
+@pytest.mark.parametrize("node_layout", ["dfs", "veb"])
+def test_node_layout(node_layout, NYC_data):
+    llvm_model = Model(model_file="tests/models/NYC_taxi/model.txt")
+    lgbm_model = Booster(model_file="tests/models/NYC_taxi/model.txt")
+    llvm_model.compile(node_layout=node_layout)
+
+    np.testing.assert_almost_equal(
+        llvm_model.predict(NYC_data[:1000], n_jobs=2),
+        lgbm_model.predict(NYC_data[:1000], n_jobs=2),
+    )
+
+
+def test_prefetch(NYC_data):
+    llvm_model = Model(model_file="tests/models/NYC_taxi/model.txt")
+    lgbm_model = Booster(model_file="tests/models/NYC_taxi/model.txt")
+
+    os.environ["LLEAVES_PRINT_UNOPTIMIZED_IR"] = "1"
+    f = io.StringIO()
+    with redirect_stdout(f):
+        llvm_model.compile(fprefetch=True)
+    os.environ["LLEAVES_PRINT_UNOPTIMIZED_IR"] = "0"
+    assert "call void @llvm.prefetch" in f.getvalue()
+
+    np.testing.assert_almost_equal(
+        llvm_model.predict(NYC_data[:1000], n_jobs=2),
+        lgbm_model.predict(NYC_data[:1000], n_jobs=2),
+    )
+
+
 def test_function_name():
     llvm_model = Model(model_file="tests/models/tiniest_single_tree/model.txt")
     lgbm_model = Booster(model_file="tests/models/tiniest_single_tree/model.txt")
@@ -90,3 +139,54 @@ def test_function_name():
         llvm_model.predict(data, n_jobs=2),
         lgbm_model.predict(data, n_jobs=2),
     )
+
+
+def test_prefer_vector_width():
+    llvm_model = Model(model_file="tests/models/tiniest_single_tree/model.txt")
+    lgbm_model = Booster(model_file="tests/models/tiniest_single_tree/model.txt")
+
+    os.environ["LLEAVES_PRINT_UNOPTIMIZED_IR"] = "1"
+    f = io.StringIO()
+    with redirect_stdout(f):
+        llvm_model.compile(prefer_vector_width=512)
+    os.environ["LLEAVES_PRINT_UNOPTIMIZED_IR"] = "0"
+    assert '"prefer-vector-width"="512"' in f.getvalue()
+
+    data = [
+        [1.0] * 3,
+        [0.0] * 3,
+        [-1.0] * 3,
+    ]
+    np.testing.assert_almost_equal(
+        llvm_model.predict(data, n_jobs=2),
+        lgbm_model.predict(data, n_jobs=2),
+    )
+
+
+@pytest.mark.parametrize("fbranchless_depth", [1, 2])
+def test_branchless_depth(fbranchless_depth):
+    llvm_model = Model(model_file="tests/models/tiniest_single_tree/model.txt")
+    lgbm_model = Booster(model_file="tests/models/tiniest_single_tree/model.txt")
+
+    os.environ["LLEAVES_PRINT_UNOPTIMIZED_IR"] = "1"
+    f = io.StringIO()
+    with redirect_stdout(f):
+        llvm_model.compile(fbranchless_depth=fbranchless_depth)
+    os.environ["LLEAVES_PRINT_UNOPTIMIZED_IR"] = "0"
+    # the tree has two levels of decision nodes, with depth 2 it doesn't branch at all
+    if fbranchless_depth == 1:
+        assert "node_1:" in f.getvalue()
+    else:
+        assert "node_1:" not in f.getvalue()
+        assert "br i1" not in f.getvalue().split("define private")[1]
+
+    data = [
+        [1.0] * 3,
+        [0.0] * 3,
+        [-1.0] * 3,
+        [np.nan] * 3,
+    ]
+    np.testing.assert_almost_equal(
+        llvm_model.predict(data, n_jobs=2),
+        lgbm_model.predict(data, n_jobs=2),
+    )
@@ -7,6 +7,7 @@ from lightgbm import Booster
 
 from lleaves import Model
 from lleaves.data_processing import (
+    categories_to_index,
     data_to_ndarray,
     extract_model_global_features,
     extract_pandas_traintime_categories,
@@ -119,3 +120,42 @@ def test_pd_empty_categories():
     np.testing.assert_almost_equal(
         llvm_model.predict(df), lgbm_model.predict(df), decimal=13
     )
+
+
+def test_target_dtype():
+    data = [[0.0, 1.0, 2.0], [1.0, 1.0, 1.0]]
+    for dtype in [np.float32, np.float64]:
+        for inp in [data, pd.DataFrame(data).astype(np.int64)]:
+            res = data_to_ndarray(inp, [], dtype=dtype)
+            assert res.dtype == dtype
+            np.testing.assert_array_equal(res, np.array(data, dtype=dtype))
+
+    # numpy arrays are only copied if the dtype differs
+    arr = np.array(data, dtype=np.float32)
+    assert data_to_ndarray(arr, dtype=np.float32) is arr
+    assert data_to_ndarray(arr) is arr
+    res = data_to_ndarray(np.array(data, dtype=np.int64), dtype=np.float64)
+    assert res.dtype == np.float64
+    np.testing.assert_array_equal(res, np.array(data, dtype=np.float64))
+
+    data = [["a", "b"], ["b", "a"]]
+    df = pd.DataFrame(data).astype("category")
+    res = data_to_ndarray(df, data, dtype=np.float32)
+    assert res.dtype == np.float32
+    np.testing.assert_array_equal(res, [[0.0, 0.0], [1.0, 1.0]])
+
+
+def test_categories_to_index():
+    categories = [["a", "b"], ["b", "a", "c"]]
+    index = categories_to_index(categories)
+    assert [list(cat) for cat in index] == categories
+    assert categories_to_index(index)[0] is index[0]
+
+    data = [["a", "b"], ["b", "a"], ["b", "c"]]
+    df = pd.DataFrame(data).astype("category")
+    np.testing.assert_array_equal(
+        data_to_ndarray(df, index), data_to_ndarray(df, categories)
+    )
+    np.testing.assert_array_equal(
+        data_to_ndarray(df, index), [[0.0, 0.0], [1.0, 1.0], [1.0, 2.0]]
+    )
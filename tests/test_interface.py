@@ -72,3 +72,43 @@ def test_cache_model(tmp_path):
     np.testing.assert_equal(
         pure_cat_llvm.predict([3 * [0.0], 3 * [1.0], 3 * [-1.0]]), res
     )
+
+
+def test_cache_bitcode(tmp_path, monkeypatch):
+    cachefp = tmp_path / "model.bin"
+    bitcodefp = tmp_path / "model.bin.bc"
+    data = [3 * [0.0], 3 * [1.0], 3 * [-1.0]]
+    pure_cat_llvm = lleaves.Model("tests/models/pure_categorical/model.txt")
+    pure_cat_llvm.compile(cache=cachefp)
+    assert cachefp.exists() and bitcodefp.exists()
+    res = pure_cat_llvm.predict(data)
+
+    # without the binary, the model is rebuilt from the bitcode without generating IR
+    cachefp.unlink()
+    monkeypatch.setattr(
+        lleaves.lleaves.compiler,
+        "compile_to_module",
+        lambda *args, **kwargs: pytest.fail("IR should be loaded from bitcode"),
+    )
+    cached_model = lleaves.Model("tests/models/pure_categorical/model.txt")
+    cached_model.compile(cache=cachefp)
+    assert cachefp.exists()
+    np.testing.assert_equal(cached_model.predict(data), res)
+
+
+def test_cache_model_no_parsing(tmp_path, monkeypatch):
+    cachefp = tmp_path / "model.bin"
+    data = [3 * [0.0], 3 * [1.0], 3 * [-1.0]]
+    pure_cat_llvm = lleaves.Model("tests/models/pure_categorical/model.txt")
+    pure_cat_llvm.compile(cache=cachefp)
+
+    # only compiling without a cache reads the trees, the constructor just reads the header & the end of the file
+    monkeypatch.setattr(
+        lleaves.compiler.tree_compiler,
+        "parse_to_ast",
+        lambda *args, **kwargs: pytest.fail("model.txt should not be parsed"),
+    )
+    cached_model = lleaves.Model("tests/models/pure_categorical/model.txt")
+    assert cached_model.num_trees() == pure_cat_llvm.num_trees()
+    cached_model.compile(cache=cachefp)
+    np.testing.assert_equal(cached_model.predict(data), pure_cat_llvm.predict(data))
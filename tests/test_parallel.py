@@ -1,9 +1,19 @@
+from concurrent.futures import ThreadPoolExecutor
 from ctypes import POINTER, c_double
 
 import numpy as np
+import pytest
 
+import lleaves
 
-def test_parallel_edgecases(NYC_llvm, NYC_lgbm):
+
+@pytest.fixture
+def parallel_small_batches(monkeypatch):
+    # split up even tiny inputs across threads
+    monkeypatch.setattr(lleaves.lleaves, "MIN_TREE_EVALUATIONS_PER_JOB", 1)
+
+
+def test_parallel_edgecases(NYC_llvm, NYC_lgbm, parallel_small_batches):
     # single row, multiple threads
     data = np.array(1 * [NYC_lgbm.num_feature() * [1.0]], dtype=np.float64)
     np.testing.assert_almost_equal(
@@ -17,7 +27,7 @@ def test_parallel_edgecases(NYC_llvm, NYC_lgbm):
     )
 
 
-def test_parallel_iteration(NYC_llvm, NYC_lgbm):
+def test_parallel_iteration(NYC_llvm, NYC_lgbm, parallel_small_batches):
     data = np.array(4 * [NYC_lgbm.num_feature() * [1.0]], dtype=np.float64)
     data_flat = np.array(data.reshape(data.size), dtype=np.float64)
     np.testing.assert_almost_equal(
@@ -35,3 +45,75 @@ def test_parallel_iteration(NYC_llvm, NYC_lgbm):
     NYC_llvm._c_entry_func(ptr_data, ptr_preds, 0, 2)
     preds_l = list(preds)
     assert preds_l[0] != 0.0 and preds_l[1] != 0.0
+
+
+def test_thread_pool_reuse(NYC_llvm, NYC_lgbm, parallel_small_batches):
+    data = np.array(8 * [NYC_lgbm.num_feature() * [1.0]], dtype=np.float64)
+    NYC_llvm.predict(data, n_jobs=4)
+    executor = NYC_llvm._executor
+    assert executor is not None
+    NYC_llvm.predict(data, n_jobs=4)
+    assert NYC_llvm._executor is executor
+
+    # the pool is shared by calls with a different number of threads
+    np.testing.assert_almost_equal(
+        NYC_llvm.predict(data, n_jobs=2), NYC_lgbm.predict(data), decimal=14
+    )
+    assert NYC_llvm._executor is executor
+
+    NYC_llvm.close()
+    assert NYC_llvm._executor is None
+    np.testing.assert_almost_equal(
+        NYC_llvm.predict(data, n_jobs=2), NYC_lgbm.predict(data), decimal=14
+    )
+
+
+def test_concurrent_predict(NYC_llvm, NYC_lgbm, parallel_small_batches):
+    NYC_llvm.close()
+    data = np.random.rand(64, NYC_lgbm.num_feature())
+    expected = NYC_lgbm.predict(data)
+
+    def predict(n_jobs):
+        for _ in range(50):
+            np.testing.assert_almost_equal(
+                NYC_llvm.predict(data, n_jobs=n_jobs), expected, decimal=14
+            )
+        return NYC_llvm._executor
+
+    # concurrent calls with different n_jobs all use the same pool
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        pools = list(executor.map(predict, range(2, 6)))
+    assert all(pool is pools[0] for pool in pools)
+
+
+def test_submitted_batches(NYC_llvm, NYC_lgbm, parallel_small_batches, monkeypatch):
+    executor = NYC_llvm._get_executor()
+    submitted = []
+
+    def submit(*args):
+        submitted.append(args[4:])
+        return ThreadPoolExecutor.submit(executor, *args)
+
+    monkeypatch.setattr(executor, "submit", submit)
+    data = np.random.rand(9, NYC_lgbm.num_feature())
+    np.testing.assert_almost_equal(
+        NYC_llvm.predict(data, n_jobs=3), NYC_lgbm.predict(data), decimal=14
+    )
+    # the calling thread predicts rows 0-2 itself
+    assert submitted == [(3, 6), (6, 9)]
+
+
+def test_small_batch_single_thread(NYC_llvm, NYC_lgbm):
+    NYC_llvm.close()
+    # 100 rows * 100 trees are predicted by the calling thread
+    data = np.array(100 * [NYC_lgbm.num_feature() * [1.0]], dtype=np.float64)
+    np.testing.assert_almost_equal(
+        NYC_llvm.predict(data, n_jobs=4), NYC_lgbm.predict(data), decimal=14
+    )
+    assert NYC_llvm._executor is None
+
+    data = np.random.rand(5000, NYC_lgbm.num_feature())
+    np.testing.assert_almost_equal(
+        NYC_llvm.predict(data, n_jobs=4), NYC_lgbm.predict(data), decimal=14
+    )
+    assert NYC_llvm._executor is not None
@@ -1,3 +1,6 @@
+import pytest
+
+from lleaves.compiler.ast import parse_to_ast
 from lleaves.compiler.ast.scanner import scan_model_file
 
 
@@ -9,7 +12,7 @@ def test_parser():
 
     tree_3 = result["trees"][3]
     assert tree_3["num_leaves"] == 18
-    assert tree_3["left_child"] == [
+    assert tree_3["left_child"].tolist() == [
         1,
         3,
         -2,
@@ -38,3 +41,51 @@ def test_parser():
     assert len(result["trees"]) == 1
     tree_0 = result["trees"][0]
     assert tree_0["num_leaves"] == 4
+
+
+def test_veb_order():
+    forest = parse_to_ast("tests/models/airline/model.txt")
+    for tree in forest.trees:
+        order = tree.veb_order()
+        assert order[0] == tree.root
+        all_nodes = list(range(len(tree.nodes))) + [
+            ~leaf for leaf in range(len(tree.leaf_value))
+        ]
+        assert sorted(order) == sorted(all_nodes)
+
+    # complete tree of height 3: the top two levels come first, followed by the leaves of each subtree
+    tree = parse_to_ast("tests/models/tiniest_single_tree/model.txt").trees[0]
+    assert tree.height() == 3
+    assert tree.veb_order() == [0, 1, 2, ~0, ~2, ~1, ~3]
+
+
+@pytest.mark.parametrize(
+    "right_child", ["right_child=2 -3 3\n", "right_child=2 -3 -5\n"]
+)
+def test_parser_invalid_children(tmp_path, right_child):
+    mod_model_file = tmp_path / "mod_model.txt"
+    with open("tests/models/tiniest_single_tree/model.txt") as file:
+        lines = file.readlines()
+    lines = [right_child if line.startswith("right_child=") else line for line in lines]
+    with open(mod_model_file, "x") as file:
+        file.writelines(lines)
+
+    with pytest.raises(AssertionError):
+        parse_to_ast(mod_model_file)
+
+
+@pytest.mark.parametrize(
+    "cat_threshold", ["cat_threshold=1 x 3\n", "cat_threshold=4294967296\n"]
+)
+def test_parser_invalid_cat_threshold(tmp_path, cat_threshold):
+    mod_model_file = tmp_path / "mod_model.txt"
+    with open("tests/models/pure_categorical/model.txt") as file:
+        lines = file.readlines()
+    lines = [
+        cat_threshold if line.startswith("cat_threshold=") else line for line in lines
+    ]
+    with open(mod_model_file, "x") as file:
+        file.writelines(lines)
+
+    with pytest.raises(ValueError):
+        scan_model_file(mod_model_file)
@@ -6,6 +6,7 @@ from hypothesis import strategies as st
 from sklearn.datasets import make_blobs, make_classification, make_regression
 
 import lleaves
+from lleaves.compiler.ast.scanner import scan_model_file
 
 MODEL_DIRS_NUMERICAL = [
     "tests/models/boston_housing/",
@@ -50,6 +51,20 @@ def llvm_lgbm_model_single_precision(request):
     )
 
 
+@pytest.fixture(
+    scope="session",
+    params=MODEL_DIRS_NUMERICAL + ["tests/models/mixed_categorical/"],
+)
+def llvm_lgbm_model_branchless(request):
+    path = request.param
+    llvm = lleaves.Model(model_file=path + "model.txt")
+    llvm.compile(fbranchless_depth=3)
+    return (
+        llvm,
+        lightgbm.Booster(model_file=path + "model.txt"),
+    )
+
+
 @pytest.fixture(
     scope="session", params=zip(MODEL_DIRS_CATEGORICAL, CAT_BITVEC_CATEGORICAL)
 )
@@ -110,6 +125,23 @@ def test_batchmode(data, llvm_lgbm_model):
     np.testing.assert_almost_equal(lgbm_result, llvm_result)
 
 
+@settings(max_examples=10)
+@given(data=st.data())
+def test_batchmode_branchless(data, llvm_lgbm_model_branchless):
+    llvm_model, lightgbm_model = llvm_lgbm_model_branchless
+    input_data = data.draw(
+        st.lists(
+            st.floats(allow_nan=True, allow_infinity=True),
+            max_size=20 * llvm_model.num_feature(),
+            min_size=20 * llvm_model.num_feature(),
+        )
+    )
+    input_data = np.array(input_data).reshape((20, llvm_model.num_feature()))
+    np.testing.assert_almost_equal(
+        lightgbm_model.predict(input_data), llvm_model.predict(input_data)
+    )
+
+
 @settings(max_examples=10)
 @given(data=st.data())
 def test_batchmode_single_precision(data, llvm_lgbm_model_single_precision):
@@ -142,6 +174,25 @@ def test_batchmode_single_precision(data, llvm_lgbm_model_single_precision):
     )
 
 
+def test_single_precision_thresholds(llvm_lgbm_model_single_precision):
+    # inputs that equal a threshold rounded to fp32 have to take the same branch as in LightGBM,
+    # which compares in fp64
+    llvm_model, lightgbm_model = llvm_lgbm_model_single_precision
+    rows = []
+    for tree in scan_model_file(llvm_model.model_file)["trees"]:
+        for feature, threshold in zip(tree["split_feature"], tree["threshold"]):
+            if abs(threshold) <= np.float32(1e-35):
+                # LightGBM treats inputs this close to zero as zero
+                continue
+            row = np.full(llvm_model.num_feature(), np.nan, dtype=np.float32)
+            row[feature] = threshold
+            rows.append(row)
+    input_data = np.array(rows, dtype=np.float32)
+    np.testing.assert_allclose(
+        lightgbm_model.predict(input_data), llvm_model.predict(input_data), rtol=1e-5
+    )
+
+
 @given(data=st.data())
 @settings(deadline=None)  # the airline model takes a few seconds to compile
 def test_forest_llvm_mode_cat(data, llvm_lgbm_model_cat):